@@ -1,17 +1,19 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime, date, timedelta
-import sys
 import os
+import json
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 import yfinance as yf
 import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
-# Add the utils directory to the Python path
-sys.path.append(os.path.join(os.path.dirname(__file__), 'utils'))
-
-from utils.data_manager import DataManager
+from utils.data_manager import DataManager, CONSOLIDATED_COLUMNS, TRADES_COLUMNS
 from utils.calculations import TradeCalculator
 
 # Chart Theme Configuration
@@ -34,6 +36,29 @@ CHART_FONTS = {
     'tick_small': dict(size=10, color=CHART_COLORS['text'])
 }
 
+# Layout and axis templates built once at import; helpers below only add per-chart fields
+CHART_LAYOUT_BASE = {
+    'plot_bgcolor': 'rgba(0,0,0,0)',
+    'paper_bgcolor': 'rgba(0,0,0,0)',
+    'hovermode': 'x unified'
+}
+
+AXIS_STYLE_LARGE = {
+    'tickfont': CHART_FONTS['tick_large'],
+    'gridcolor': CHART_COLORS['grid'],
+    'showgrid': True,
+    'zeroline': False
+}
+
+AXIS_STYLE_SMALL = {**AXIS_STYLE_LARGE, 'tickfont': CHART_FONTS['tick_small']}
+
+# Maximum points drawn on a price chart; longer histories are downsampled
+MAX_CHART_POINTS = 2000
+
+# Trade type codes and their display labels
+TRADE_TYPE_LABELS = {"B": "Buy", "S": "Sell", "T": "Transfer"}
+TRADE_TYPE_OPTIONS = ('All', *TRADE_TYPE_LABELS)
+
 # Page configuration
 st.set_page_config(
     page_title="Stock Tracker",
@@ -42,19 +67,22 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialize data manager and calculator
+# Initialize data manager and calculator (one cached pair so they always share state)
 @st.cache_resource
-def get_data_manager():
-    return DataManager()
+def get_services():
+    data_manager = DataManager()
+    return data_manager, TradeCalculator(data_manager)
 
-@st.cache_resource
-def get_trade_calculator():
-    return TradeCalculator(get_data_manager())
+data_manager, calculator = get_services()
 
-data_manager = get_data_manager()
-calculator = get_trade_calculator()
+# A legacy CSV that failed to import leaves its Parquet file unwritten; drop the cached
+# services so the import is retried on the next run, once the CSV has been fixed
+if not all(os.path.exists(p) for p in (data_manager.consolidated_path, data_manager.trades_path)):
+    get_services.clear()
+    st.error(f"Fix the CSV files in '{data_manager.data_dir}' and reload the page to import them.")
+    st.stop()
 
-# One-time migration to integerize quantities in CSVs
+# One-time migration to integerize stored quantities
 try:
     data_manager.migrate_integer_quantities()
 except Exception:
@@ -74,96 +102,364 @@ def format_currency(value):
         return "$0.00"
     return f"${value:,.2f}"
 
+@lru_cache(maxsize=4096)
 def format_number(value):
     """Format number values with appropriate decimal places."""
     if pd.isna(value):
         return "0"
     
+    # Trailing zeros (and a bare decimal point) are trimmed by trim='-'
     # If the value is less than 1, show up to 4 decimal places
     if abs(value) < 1:
-        return f"{value:.4f}".rstrip('0').rstrip('.')
+        return np.format_float_positional(value, precision=4, unique=False, trim='-')
     # If the value is less than 10, show 2 decimal places
     elif abs(value) < 10:
-        return f"{value:.2f}".rstrip('0').rstrip('.')
+        return np.format_float_positional(value, precision=2, unique=False, trim='-')
     # For larger values, show no decimal places
     else:
         return f"{value:,.0f}"
 
-# Lookup helper for stock names from symbol
-@st.cache_data(ttl=86400)
-def lookup_stock_name(symbol: str) -> str | None:
+# Cached data loaders keyed on file mtime so reruns skip re-parsing unchanged files.
+# Older mtimes are never requested again, so only the latest couple of entries are kept.
+@st.cache_data(max_entries=2)
+def _load_consolidated(path: str, mtime: float) -> pd.DataFrame:
+    # Text columns arrive as categories from DataManager, so filters and option lists stay cheap
+    df = data_manager.read_consolidated(columns=CONSOLIDATED_COLUMNS)
+    # Book value per holding, computed once per file change instead of per render
+    if 'Quantity' in df.columns:
+        df['Value'] = df['Quantity'].to_numpy() * df['AveragePricePerShare'].to_numpy(dtype=float)
+    return df
+
+@st.cache_data(max_entries=2)
+def _load_trades(path: str, mtime: float) -> pd.DataFrame:
+    df = data_manager.read_trades(columns=TRADES_COLUMNS)
+    # Relabel trade type codes once here rather than mapping them on every render
+    if 'TradeType' in df.columns:
+        df['TradeType'] = df['TradeType'].cat.rename_categories(TRADE_TYPE_LABELS)
+    return df
+
+def load_consolidated() -> pd.DataFrame:
+    """Consolidated holdings, reloaded only when the file changes on disk."""
+    path = data_manager.consolidated_path
+    return _load_consolidated(path, os.path.getmtime(path))
+
+def load_trades() -> pd.DataFrame:
+    """Trade history, reloaded only when the file changes on disk."""
+    path = data_manager.trades_path
+    return _load_trades(path, os.path.getmtime(path))
+
+# Filtered views keyed on file mtime plus the filter values, so reruns with
+# unchanged filters reuse the view instead of re-masking the full frame
+@st.cache_data(max_entries=32)
+def _filter_consolidated(path: str, mtime: float, account: str, symbol: str) -> pd.DataFrame:
+    df = _load_consolidated(path, mtime)
+    mask = np.ones(len(df), dtype=bool)
+    if account != 'All':
+        mask &= (df['Account'] == account).to_numpy()
+    if symbol != 'All':
+        mask &= (df['StockSymbol'] == symbol).to_numpy()
+    return df.loc[mask]
+
+@st.cache_data(max_entries=32)
+def _filter_trades(path: str, mtime: float, account: str, symbol: str, trade_type: str) -> pd.DataFrame:
+    df = _load_trades(path, mtime)
+    mask = np.ones(len(df), dtype=bool)
+    if account != 'All':
+        mask &= (df['Account'] == account).to_numpy()
+    if symbol != 'All':
+        mask &= (df['StockSymbol'] == symbol).to_numpy()
+    if trade_type != 'All':
+        mask &= (df['TradeType'] == TRADE_TYPE_LABELS[trade_type]).to_numpy()
+    return df.loc[mask]
+
+def load_filtered_consolidated(account: str, symbol: str) -> pd.DataFrame:
+    """Consolidated holdings matching the given filters ('All' disables a filter)."""
+    path = data_manager.consolidated_path
+    return _filter_consolidated(path, os.path.getmtime(path), account, symbol)
+
+def load_filtered_trades(account: str, symbol: str, trade_type: str) -> pd.DataFrame:
+    """Trades matching the given filters ('All' disables a filter)."""
+    path = data_manager.trades_path
+    return _filter_trades(path, os.path.getmtime(path), account, symbol, trade_type)
+
+# Portfolio overview rows keyed on file mtime plus the price snapshot (as sorted
+# (symbol, price) pairs), so reruns between price refreshes reuse the same frame
+@st.cache_data(max_entries=8)
+def _portfolio_view(path: str, mtime: float, prices: tuple) -> pd.DataFrame:
+    df = _load_consolidated(path, mtime)
+    # Every holding (a symbol can be held in several accounts) gets its symbol's price;
+    # holdings whose symbol has no current price are left out
+    portfolio_df = pd.DataFrame({
+        'Symbol': df['StockSymbol'].astype(str),
+        'Shares': df['Quantity'],
+        'Avg Cost': df['AveragePricePerShare']
+    })
+    portfolio_df['Current Price'] = portfolio_df['Symbol'].map(dict(prices))
+    portfolio_df = portfolio_df.dropna(subset=['Current Price'])
+    portfolio_df['Cost Basis'] = portfolio_df['Shares'] * portfolio_df['Avg Cost']
+    portfolio_df['Current Value'] = portfolio_df['Shares'] * portfolio_df['Current Price']
+    portfolio_df['Gain/Loss'] = portfolio_df['Current Value'] - portfolio_df['Cost Basis']
+    return portfolio_df
+
+def load_portfolio_view(current_prices: dict) -> pd.DataFrame:
+    """Holdings valued at the given current prices; holdings without a price are left out."""
+    path = data_manager.consolidated_path
+    return _portfolio_view(path, os.path.getmtime(path), tuple(sorted(current_prices.items())))
+
+@st.cache_data
+def _accounts(path: str, mtime: float) -> list:
+    df = _load_consolidated(path, mtime)
+    return df['Account'].cat.categories.tolist() if not df.empty else []
+
+@st.cache_data
+def _stock_symbols(path: str, mtime: float) -> list:
+    df = _load_consolidated(path, mtime)
+    return df['StockSymbol'].cat.categories.tolist() if not df.empty else []
+
+@st.cache_data
+def _account_options(path: str, mtime: float) -> tuple:
+    return ('All', *_accounts(path, mtime))
+
+@st.cache_data
+def _symbol_options(path: str, mtime: float) -> tuple:
+    return ('All', *_stock_symbols(path, mtime))
+
+def load_accounts() -> list:
+    """Unique accounts from the cached consolidated frame."""
+    path = data_manager.consolidated_path
+    return _accounts(path, os.path.getmtime(path))
+
+def load_account_options() -> tuple:
+    """Account filter options, including 'All'."""
+    path = data_manager.consolidated_path
+    return _account_options(path, os.path.getmtime(path))
+
+def load_symbol_options() -> tuple:
+    """Stock symbol filter options, including 'All'."""
+    path = data_manager.consolidated_path
+    return _symbol_options(path, os.path.getmtime(path))
+
+def clear_data_cache():
+    """Drop cached frames after a write so the next run re-reads the files."""
+    _load_consolidated.clear()
+    _load_trades.clear()
+    _filter_consolidated.clear()
+    _filter_trades.clear()
+    _portfolio_view.clear()
+    _accounts.clear()
+    _stock_symbols.clear()
+    _account_options.clear()
+    _symbol_options.clear()
+
+# Lookup helper for stock names from symbol. Names effectively never change, so
+# successful lookups are persisted to disk and survive server restarts (persisted
+# caches don't support a TTL). Failures raise rather than return, since Streamlit
+# doesn't cache exceptions and an unresolved symbol should be retried next time.
+@st.cache_data(persist="disk")
+def lookup_stock_name(symbol: str) -> str:
+    ticker = yf.Ticker(symbol)
+    # Try info dict first (more consistent)
+    info = ticker.info
+    name = None
+    if isinstance(info, dict):
+        name = info.get('shortName') or info.get('longName') or info.get('symbol')
+    if name and isinstance(name, str) and name.strip():
+        return name.strip()
+    raise LookupError(f"No name found for {symbol}")
+
+# Misses are remembered in memory for an hour, so a mistyped symbol doesn't trigger
+# a blocking lookup on every rerun, yet is retried later instead of stuck on disk
+@st.cache_data(ttl=3600)
+def resolve_stock_name(symbol: str) -> str | None:
+    """Look up a symbol's name, or None when it can't be resolved."""
+    if not symbol:
+        return None
     try:
-        if not symbol:
-            return None
-        ticker = yf.Ticker(symbol)
-        # Try info dict first (more consistent)
-        info = ticker.info
-        name = None
-        if isinstance(info, dict):
-            name = info.get('shortName') or info.get('longName') or info.get('symbol')
-        # Fallback
-        if name and isinstance(name, str) and name.strip():
-            return name.strip()
+        return lookup_stock_name(symbol)
+    except Exception:
+        return None
+
+# Latest prices for many symbols in one batched request
+@st.cache_data(ttl=300)  # Cache for 5 minutes
+def get_current_prices(symbols: tuple) -> dict:
+    """Return {symbol: last close}; symbols with no data are left out."""
+    if not symbols:
+        return {}
+    prices = {}
+    try:
+        # A few days back so symbols on exchanges closed today still have a last close
+        data = yf.download(
+            list(symbols), period="5d", group_by='ticker',
+            auto_adjust=True, threads=True, progress=False
+        )
+        downloaded = set(data.columns.get_level_values(0))
+        for symbol in symbols:
+            if symbol not in downloaded:
+                continue
+            closes = data[symbol]['Close'].dropna()
+            if not closes.empty:
+                prices[symbol] = float(closes.iloc[-1])
     except Exception:
         pass
-    return None
+    
+    # Symbols the batch missed get one individual retry each, fetched in parallel.
+    # A local pool, since this itself may be running on the shared fetch pool
+    missing = [symbol for symbol in symbols if symbol not in prices]
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(8, len(missing))) as pool:
+            for symbol, price in zip(missing, pool.map(get_last_close, missing)):
+                if price is not None:
+                    prices[symbol] = price
+    return prices
+
+def get_last_close(symbol: str) -> float | None:
+    """Last close for one symbol, or None if it can't be fetched."""
+    try:
+        closes = yf.Ticker(symbol).history(period="5d", auto_adjust=True)['Close'].dropna()
+        return float(closes.iloc[-1]) if not closes.empty else None
+    except Exception:
+        return None
+
+# Price history and info for the chart page
+@st.cache_resource(ttl=300)  # Cache for 5 minutes
+def get_stock_data(symbol, period):
+    """
+    Fetch price history and info for a symbol. Results are shared, not copied,
+    across reruns (cache_resource), so callers must treat them as read-only.
+    """
+    try:
+        ticker = yf.Ticker(symbol)
+        data = ticker.history(period=period)
+        
+        if data.empty:
+            st.warning(f"No data available for {symbol} with period {period}")
+            return None, None
+        
+        info = ticker.info
+        return data, info
+    except Exception as e:
+        st.error(f"Error fetching data for {symbol}: {e}")
+        return None, None
+
+# Shared worker pool so independent network fetches can overlap
+@st.cache_resource
+def get_fetch_pool():
+    return ThreadPoolExecutor(max_workers=8)
+
+def submit_fetch(fn, *args):
+    """Run fn(*args) on the fetch pool with this session's script context attached."""
+    ctx = get_script_run_ctx()
+    
+    def run():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+    
+    return get_fetch_pool().submit(run)
 
 # Chart Helper Functions
 def get_common_chart_layout(height=500):
     """Returns common layout settings for charts."""
-    return {
-        'plot_bgcolor': 'rgba(0,0,0,0)',
-        'paper_bgcolor': 'rgba(0,0,0,0)',
-        'hovermode': 'x unified',
-        'height': height
-    }
+    return {**CHART_LAYOUT_BASE, 'height': height}
 
 def get_axis_style(title_text, is_large=True):
     """Returns styled axis configuration."""
-    return {
-        'title': dict(
-            text=title_text, 
-            font=CHART_FONTS['axis_title'] if is_large else CHART_FONTS['axis_title_small']
-        ),
-        'tickfont': CHART_FONTS['tick_large'] if is_large else CHART_FONTS['tick_small'],
-        'gridcolor': CHART_COLORS['grid'],
-        'showgrid': True,
-        'zeroline': False
-    }
+    if is_large:
+        return {**AXIS_STYLE_LARGE, 'title': dict(text=title_text, font=CHART_FONTS['axis_title'])}
+    return {**AXIS_STYLE_SMALL, 'title': dict(text=title_text, font=CHART_FONTS['axis_title_small'])}
 
-def create_price_chart(data, symbol, stock_name, timeframe):
-    """Creates a styled price line chart."""
-    fig = go.Figure()
+def lttb_positions(data, threshold=MAX_CHART_POINTS):
+    """
+    Row positions that downsample a price history to about `threshold` rows using
+    Largest-Triangle-Three-Buckets on the Close column, keeping the visual shape.
+    Every position is returned when the history is already short enough.
+    """
+    n = len(data)
+    if threshold < 3 or n <= threshold:
+        return np.arange(n)
+    
+    if isinstance(data.index, pd.DatetimeIndex):
+        x = data.index.asi8.astype(float)
+    else:
+        x = np.arange(n, dtype=float)
+    y = data['Close'].to_numpy(dtype=float)
+    
+    # First and last points are always kept; the rest is split into threshold - 2 buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
     
-    # Main price line
-    fig.add_trace(go.Scatter(
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        
+        # Pick the point in this bucket forming the largest triangle with the
+        # previously selected point and the next bucket's average
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) -
+            (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    
+    return selected
+
+def downsample_lttb(data, positions):
+    """Keep the rows at `positions` (from lttb_positions)."""
+    if len(positions) == len(data):
+        return data
+    return data.iloc[positions]
+
+def downsample_volume(data, positions):
+    """
+    Volume at the rows at `positions`, each bar summing the volume up to the next
+    position so the downsampled bars still add up to the period's total.
+    """
+    if len(positions) == len(data):
+        return data
+    volume = np.add.reduceat(data['Volume'].to_numpy(), positions)
+    return pd.DataFrame({'Volume': volume}, index=data.index[positions])
+
+def get_price_trace(data, symbol):
+    """Returns the price line trace, filled down to the axis."""
+    # WebGL so long timeframes stay responsive; WebGL has no spline shape
+    return go.Scattergl(
         x=data.index,
         y=data['Close'],
         mode='lines',
         name=symbol,
         line=dict(
             color=CHART_COLORS['primary'],
-            width=3,
-            shape='spline',
-            smoothing=0.3
+            width=3
         ),
+        fill='tozeroy',
+        fillcolor=CHART_COLORS['primary_transparent'],
         hovertemplate='<b>%{x}</b><br>Price: $%{y:.2f}<extra></extra>'
-    ))
-    
-    # Fill under line
-    fig.add_trace(go.Scatter(
+    )
+
+def get_volume_trace(data):
+    """Returns the volume bar trace."""
+    return go.Bar(
         x=data.index,
-        y=data['Close'],
-        mode='lines',
-        line=dict(width=0),
+        y=data['Volume'],
+        name="Volume",
         showlegend=False,
-        hoverinfo='skip',
-        fill='tonexty',
-        fillcolor=CHART_COLORS['primary_transparent']
-    ))
+        marker_color=CHART_COLORS['primary_semi'],
+        marker_line_color=CHART_COLORS['primary_dark'],
+        marker_line_width=1,
+        hovertemplate='<b>%{x}</b><br>Volume: %{y:,}<extra></extra>'
+    )
+
+def get_price_chart_layout(data, symbol, stock_name, timeframe, height=500):
+    """Returns the layout shared by the price chart and the price/volume chart."""
+    # A zero fill would otherwise stretch the autorange down to $0, flattening the line
+    low, high = data['Close'].min(), data['Close'].max()
+    pad = (high - low) * 0.05 or abs(high) * 0.05 or 1
     
-    # Apply layout
-    layout = get_common_chart_layout(height=500)
+    layout = get_common_chart_layout(height=height)
     layout.update({
         'title': dict(
             text=f"{symbol} - {stock_name} ({timeframe})",
@@ -172,7 +468,11 @@ def create_price_chart(data, symbol, stock_name, timeframe):
             xanchor='center'
         ),
         'xaxis': get_axis_style("Date", is_large=True),
-        'yaxis': {**get_axis_style("Price ($)", is_large=True), 'tickformat': '$.2f'},
+        'yaxis': {
+            **get_axis_style("Price ($)", is_large=True),
+            'tickformat': '$.2f',
+            'range': [low - pad, high + pad]
+        },
         'margin': dict(l=50, r=50, t=80, b=50),
         'showlegend': True,
         'legend': dict(
@@ -184,42 +484,66 @@ def create_price_chart(data, symbol, stock_name, timeframe):
             font=CHART_FONTS['tick_large']
         )
     })
-    
-    fig.update_layout(layout)
+    return layout
+
+def create_price_chart(data, symbol, stock_name, timeframe):
+    """Creates a styled price line chart."""
+    fig = go.Figure(data=[get_price_trace(data, symbol)])
+    fig.update_layout(get_price_chart_layout(data, symbol, stock_name, timeframe))
     return fig
 
-def create_volume_chart(data, symbol, timeframe):
-    """Creates a styled volume bar chart."""
-    fig = go.Figure()
-    
-    fig.add_trace(go.Bar(
-        x=data.index,
-        y=data['Volume'],
-        name="Volume",
-        marker_color=CHART_COLORS['primary_semi'],
-        marker_line_color=CHART_COLORS['primary_dark'],
-        marker_line_width=1,
-        hovertemplate='<b>%{x}</b><br>Volume: %{y:,}<extra></extra>'
-    ))
+def create_price_and_volume_chart(price_data, volume_data, symbol, stock_name, timeframe):
+    """
+    Creates the price chart with a volume panel underneath, as one figure with a
+    shared date axis so the browser sets up a single plot instead of two.
+    """
+    fig = make_subplots(
+        rows=2, cols=1, shared_xaxes=True,
+        row_heights=[0.7, 0.3], vertical_spacing=0.05
+    )
+    fig.add_trace(get_price_trace(price_data, symbol), row=1, col=1)
+    fig.add_trace(get_volume_trace(volume_data), row=2, col=1)
     
-    # Apply layout
-    layout = get_common_chart_layout(height=300)
+    # Apply layout; the date title moves to the bottom (volume) axis
+    layout = get_price_chart_layout(price_data, symbol, stock_name, timeframe, height=800)
     layout.update({
-        'title': dict(
-            text=f"{symbol} Volume ({timeframe})",
-            font=CHART_FONTS['title_medium'],
-            x=0.5,
-            xanchor='center'
-        ),
-        'xaxis': get_axis_style("Date", is_large=False),
-        'yaxis': get_axis_style("Volume", is_large=False),
-        'margin': dict(l=50, r=50, t=60, b=50),
-        'showlegend': False
+        'xaxis': get_axis_style("", is_large=True),
+        'xaxis2': get_axis_style("Date", is_large=False),
+        'yaxis2': get_axis_style("Volume", is_large=False)
     })
     
     fig.update_layout(layout)
     return fig
 
+@st.cache_data(ttl=300, max_entries=32)  # Same lifetime as the price data it is drawn from
+def get_price_figure_json(symbol, stock_name, timeframe, index_bytes, values_bytes, _data):
+    """
+    Build the Stock Charts figure and return it as Plotly JSON, so reruns with the
+    same history skip downsampling and figure construction. `_data` is not hashed;
+    `index_bytes`/`values_bytes` identify it instead.
+    """
+    # Price and volume are cut down to the same points, so the figure's size doesn't
+    # grow with the timeframe
+    positions = lttb_positions(_data)
+    if 'Volume' in _data.columns:
+        fig = create_price_and_volume_chart(
+            downsample_lttb(_data, positions), downsample_volume(_data, positions),
+            symbol, stock_name, timeframe
+        )
+    else:
+        fig = create_price_chart(downsample_lttb(_data, positions), symbol, stock_name, timeframe)
+    return fig.to_json()
+
+@st.cache_data(max_entries=8)
+def get_allocation_figure_json(names: tuple, values: tuple) -> str:
+    """Build the portfolio allocation pie and return it as Plotly JSON, reused while holdings and prices are unchanged."""
+    fig_pie = px.pie(
+        values=list(values),
+        names=list(names),
+        title="Portfolio Allocation by Value"
+    )
+    return fig_pie.to_json()
+
 # Helper function to get available stocks for sell/transfer
 def get_available_stocks_for_sell(account: str = None) -> list:
     """
@@ -227,7 +551,7 @@ def get_available_stocks_for_sell(account: str = None) -> list:
     Returns list of tuples: (symbol, display_name, quantity)
     """
     try:
-        df = data_manager.read_consolidated()
+        df = load_consolidated()
         if df.empty:
             return []
         
@@ -235,112 +559,110 @@ def get_available_stocks_for_sell(account: str = None) -> list:
         if account:
             df = df[df['Account'] == account]
         
-        # Ensure integer quantities and include stocks with quantity > 0
-        if 'Quantity' in df.columns:
-            df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce').fillna(0).round().astype(int)
+        # Include stocks with quantity > 0 (quantities are integers from the loader)
         df = df[df['Quantity'] > 0]
         
-        available_stocks = []
-        for _, row in df.iterrows():
-            symbol = row['StockSymbol']
-            name = row['StockName']
-            quantity = int(row['Quantity'])
-            account_name = row['Account']
-            
-            # Integer quantity display
-            qty_display = f"{quantity:d}"
-            
-            display_name = f"{symbol} - {name} ({qty_display} shares in {account_name})"
-            available_stocks.append((symbol, display_name, quantity))
+        # Build display strings column-wise rather than row by row
+        symbols = df['StockSymbol'].astype(str)
+        display_names = (
+            symbols + ' - ' + df['StockName'].astype(str) +
+            ' (' + df['Quantity'].astype(str) + ' shares in ' + df['Account'].astype(str) + ')'
+        )
         
-        return available_stocks
+        return list(zip(symbols.tolist(), display_names.tolist(), df['Quantity'].tolist()))
     except:
         return []
 
 # Page 1: Consolidated Record (Dashboard)
-if page == "Consolidated Record":
+@st.fragment
+def render_consolidated_record():
     st.title("Consolidated Record")
     st.markdown("View all your stock holdings across all accounts")
     
     # Load consolidated data
-    df = data_manager.read_consolidated()
+    df = load_consolidated()
     
     if df.empty:
         st.info("No holdings found. Use 'Pre-populate Database' to add existing holdings or 'Trade Entry' to record trades.")
     else:
-        # Summary statistics
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            total_holdings = len(df)
-            st.metric("Total Holdings", total_holdings)
-        
-        with col2:
-            total_quantity = df['Quantity'].sum()
-            st.metric("Total Shares", format_number(total_quantity))
-        
-        with col3:
-            total_value = (df['Quantity'] * df['AveragePricePerShare']).sum()
-            st.metric("Total Value", format_currency(total_value))
-        
-        with col4:
-            total_gain_loss = df['CapitalGainLoss'].sum()
-            st.metric("Total Gain/Loss", format_currency(total_gain_loss))
+        # Summary statistics are filled in once the filters below have been applied
+        summary = st.container()
         
-        # Filters
+        # Filters (inside a form so changing a dropdown doesn't rerun the page until applied)
         st.subheader("Filters")
-        col1, col2 = st.columns(2)
+        with st.form("consolidated_filters"):
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                accounts = load_account_options()
+                selected_account = st.selectbox("Filter by Account", accounts, key="consolidated_account")
+            
+            with col2:
+                symbols = load_symbol_options()
+                selected_symbol = st.selectbox("Filter by Stock Symbol", symbols, key="consolidated_symbol")
+            
+            st.form_submit_button("Apply")
         
-        with col1:
-            accounts = ['All'] + data_manager.get_accounts()
-            selected_account = st.selectbox("Filter by Account", accounts)
+        # Apply filters
+        filtered_df = load_filtered_consolidated(selected_account, selected_symbol)
         
-        with col2:
-            symbols = ['All'] + data_manager.get_stock_symbols()
-            selected_symbol = st.selectbox("Filter by Stock Symbol", symbols)
+        # Summary statistics for the filtered holdings
+        # (one aggregation over the three columns instead of a pass per column)
+        totals = filtered_df[['Quantity', 'Value', 'CapitalGainLoss']].sum()
+        total_holdings = len(filtered_df)
+        total_quantity = totals['Quantity']
+        total_value = totals['Value']
+        total_gain_loss = totals['CapitalGainLoss']
         
-        # Apply filters
-        filtered_df = df.copy()
-        if selected_account != 'All':
-            filtered_df = filtered_df[filtered_df['Account'] == selected_account]
-        if selected_symbol != 'All':
-            filtered_df = filtered_df[filtered_df['StockSymbol'] == selected_symbol]
+        with summary:
+            col1, col2, col3, col4 = st.columns(4)
+            
+            with col1:
+                st.metric("Total Holdings", total_holdings)
+            
+            with col2:
+                st.metric("Total Shares", format_number(total_quantity))
+            
+            with col3:
+                st.metric("Total Value", format_currency(total_value))
+            
+            with col4:
+                st.metric("Total Gain/Loss", format_currency(total_gain_loss))
         
         # Display table
         if not filtered_df.empty:
-            # Format the dataframe for display
-            display_df = filtered_df.copy()
-            display_df['Quantity'] = display_df['Quantity'].apply(format_number)
-            display_df['AveragePricePerShare'] = display_df['AveragePricePerShare'].apply(format_currency)
-            display_df['CapitalGainLoss'] = display_df['CapitalGainLoss'].apply(format_currency)
-            display_df['DateOfAcquisition'] = pd.to_datetime(display_df['DateOfAcquisition']).dt.strftime('%Y-%m-%d')
-            
-            # Rename columns for better display
-            display_df = display_df.rename(columns={
-                'Account': 'Account',
-                'StockName': 'Stock Name',
-                'StockSymbol': 'Symbol',
-                'Quantity': 'Quantity',
-                'AveragePricePerShare': 'Avg Price/Share',
-                'CapitalGainLoss': 'Gain/Loss',
-                'DateOfAcquisition': 'Date Acquired'
-            })
-            
-            st.dataframe(display_df, width='stretch')
+            # Labels and number/date formats are applied client-side via column_config
+            st.dataframe(
+                filtered_df,
+                width='stretch',
+                column_order=(
+                    'Account', 'StockName', 'StockSymbol', 'Quantity',
+                    'AveragePricePerShare', 'CapitalGainLoss', 'DateOfAcquisition'
+                ),
+                column_config={
+                    'StockName': st.column_config.Column('Stock Name'),
+                    'StockSymbol': st.column_config.Column('Symbol'),
+                    'Quantity': st.column_config.NumberColumn('Quantity', format='localized'),
+                    'AveragePricePerShare': st.column_config.NumberColumn('Avg Price/Share', format='dollar'),
+                    'CapitalGainLoss': st.column_config.NumberColumn('Gain/Loss', format='dollar'),
+                    'DateOfAcquisition': st.column_config.DateColumn('Date Acquired', format='YYYY-MM-DD')
+                }
+            )
         else:
             st.info("No holdings match the selected filters.")
 
 # Page 2: Trade Entry
-elif page == "Trade Entry":
+@st.fragment
+def render_trade_entry():
     st.title("Trade Entry")
     st.markdown("Record new stock trades")
     
     # Get existing accounts for dropdown
-    existing_accounts = data_manager.get_accounts()
+    existing_accounts = load_accounts()
     
     # Trade type selection (outside form for immediate updates)
     trade_type = st.selectbox("Trade Type", ["B", "S", "T"], 
-                            format_func=lambda x: {"B": "Buy", "S": "Sell", "T": "Transfer"}[x])
+                            format_func=TRADE_TYPE_LABELS.get)
     
     with st.form("trade_form", clear_on_submit=False):
         st.subheader("Trade Details")
@@ -399,7 +721,7 @@ elif page == "Trade Entry":
             else:  # Buy
                 stock_symbol = st.text_input("Stock Symbol", placeholder="e.g., AAPL").upper()
                 # Resolve stock name from symbol with fallback to symbol
-                resolved_name = lookup_stock_name(stock_symbol) if stock_symbol else None
+                resolved_name = resolve_stock_name(stock_symbol)
                 display_name = resolved_name or (stock_symbol if stock_symbol else "")
                 if display_name:
                     st.caption(f"Name: {display_name}")
@@ -525,6 +847,7 @@ elif page == "Trade Entry":
                     success, message = calculator.process_trade(trade_data)
                 
                 if success:
+                    clear_data_cache()
                     st.success(message)
                     # Clear only after successful processing (do not clear on preview)
                     for k in [
@@ -539,9 +862,52 @@ elif page == "Trade Entry":
                         st.session_state.pop(k, None)
                 else:
                     st.error(message)
+    
+    # Several trades at once: the history and holdings are each written once, and
+    # nothing is recorded if any trade in the file is invalid
+    with st.expander("Import Trades from CSV"):
+        st.caption(
+            "One trade per row, in the order they happened, with columns "
+            + ", ".join(TRADES_COLUMNS) + ". Commission is optional."
+        )
+        # A new key after each import gives an empty uploader, so the same file can't be imported twice
+        upload_count = st.session_state.setdefault("trades_csv_imports", 0)
+        uploaded = st.file_uploader("Trades CSV", type="csv", key=f"trades_csv_{upload_count}")
+        if "trades_csv_message" in st.session_state:
+            st.success(st.session_state.pop("trades_csv_message"))
+        if uploaded is not None:
+            try:
+                imported = pd.read_csv(uploaded, dtype={'Account': str, 'StockName': str, 'StockSymbol': str, 'TradeType': str})
+            except Exception as e:
+                st.error(f"Could not read CSV: {e}")
+                return
+            
+            missing = [c for c in TRADES_COLUMNS if c != 'Commission' and c not in imported.columns]
+            if missing:
+                st.error(f"Missing columns: {', '.join(missing)}")
+            elif imported.empty:
+                st.info("The file has no trades.")
+            else:
+                imported['Account'] = imported['Account'].str.strip()
+                imported['StockName'] = imported['StockName'].str.strip()
+                imported['StockSymbol'] = imported['StockSymbol'].str.strip().str.upper()
+                st.dataframe(imported, width='stretch', hide_index=True)
+                
+                if st.button("Import Trades", type="primary"):
+                    with st.spinner("Processing trades..."):
+                        success, message = calculator.process_trades(imported.to_dict('records'))
+                    
+                    if success:
+                        clear_data_cache()
+                        st.session_state["trades_csv_imports"] = upload_count + 1
+                        st.session_state["trades_csv_message"] = message
+                        st.rerun()
+                    else:
+                        st.error(message)
 
 # Page 3: Pre-populate Database
-elif page == "Pre-populate Database":
+@st.fragment
+def render_prepopulate_database():
     st.title("Pre-populate Database")
     st.markdown("Add existing stock holdings to the database")
     
@@ -552,7 +918,7 @@ elif page == "Pre-populate Database":
         
         with col1:
             # Account selection
-            existing_accounts = data_manager.get_accounts()
+            existing_accounts = load_accounts()
             if existing_accounts:
                 account = st.selectbox("Account", existing_accounts)
             else:
@@ -560,7 +926,7 @@ elif page == "Pre-populate Database":
             
             stock_symbol = st.text_input("Stock Symbol", placeholder="e.g., AAPL").upper()
             # Resolve stock name from symbol with fallback to symbol
-            resolved_name = lookup_stock_name(stock_symbol) if stock_symbol else None
+            resolved_name = resolve_stock_name(stock_symbol)
             display_name = resolved_name or (stock_symbol if stock_symbol else "")
             if display_name:
                 st.caption(f"Name: {display_name}")
@@ -603,6 +969,7 @@ elif page == "Pre-populate Database":
                     success, message = calculator.add_existing_holding(holding_data)
                 
                 if success:
+                    clear_data_cache()
                     # Avoid Markdown parsing issues by rendering message as plain text
                     st.success("Trade processed successfully.")
                     st.text(message)
@@ -613,70 +980,59 @@ elif page == "Pre-populate Database":
                     st.error(message)
 
 # Page 4: Trade History
-elif page == "Trade History":
+@st.fragment
+def render_trade_history():
     st.title("Trade History")
     st.markdown("View all recorded trades")
     
     # Load trades data
-    df = data_manager.read_trades()
+    df = load_trades()
     
     if df.empty:
         st.info("No trades found. Use 'Trade Entry' to record trades.")
     else:
-        # Filters
+        # Filters (inside a form so changing a dropdown doesn't rerun the page until applied)
         st.subheader("Filters")
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            accounts = ['All'] + data_manager.get_accounts()
-            selected_account = st.selectbox("Filter by Account", accounts, key="history_account")
-        
-        with col2:
-            symbols = ['All'] + data_manager.get_stock_symbols()
-            selected_symbol = st.selectbox("Filter by Stock Symbol", symbols, key="history_symbol")
-        
-        with col3:
-            trade_types = ['All', 'B', 'S', 'T']
-            selected_type = st.selectbox("Filter by Trade Type", trade_types, 
-                                       format_func=lambda x: {"All": "All", "B": "Buy", "S": "Sell", "T": "Transfer"}[x])
+        with st.form("history_filters"):
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                accounts = load_account_options()
+                selected_account = st.selectbox("Filter by Account", accounts, key="history_account")
+            
+            with col2:
+                symbols = load_symbol_options()
+                selected_symbol = st.selectbox("Filter by Stock Symbol", symbols, key="history_symbol")
+            
+            with col3:
+                selected_type = st.selectbox("Filter by Trade Type", TRADE_TYPE_OPTIONS, key="history_type",
+                                           format_func=lambda x: TRADE_TYPE_LABELS.get(x, x))
+            
+            st.form_submit_button("Apply")
         
         # Apply filters
-        filtered_df = df.copy()
-        if selected_account != 'All':
-            filtered_df = filtered_df[filtered_df['Account'] == selected_account]
-        if selected_symbol != 'All':
-            filtered_df = filtered_df[filtered_df['StockSymbol'] == selected_symbol]
-        if selected_type != 'All':
-            filtered_df = filtered_df[filtered_df['TradeType'] == selected_type]
+        filtered_df = load_filtered_trades(selected_account, selected_symbol, selected_type)
         
         # Display table
         if not filtered_df.empty:
-            # Format the dataframe for display
-            display_df = filtered_df.copy()
-            display_df['SharesTraded'] = display_df['SharesTraded'].apply(format_number)
-            display_df['PricePerShare'] = display_df['PricePerShare'].apply(format_currency)
-            display_df['Commission'] = display_df['Commission'].apply(format_currency)
-            display_df['DateOfTrade'] = pd.to_datetime(display_df['DateOfTrade']).dt.strftime('%Y-%m-%d')
-            
-            # Rename columns for better display
-            display_df = display_df.rename(columns={
-                'Account': 'Account',
-                'StockName': 'Stock Name',
-                'StockSymbol': 'Symbol',
-                'DateOfTrade': 'Date',
-                'TradeType': 'Type',
-                'SharesTraded': 'Shares',
-                'PricePerShare': 'Price/Share',
-                'Commission': 'Commission'
-            })
-            
-            # Format trade type
-            display_df['Type'] = display_df['Type'].map({'B': 'Buy', 'S': 'Sell', 'T': 'Transfer'})
-            
-            st.dataframe(display_df, width='stretch')
+            # Labels and number/date formats are applied client-side via column_config
+            st.dataframe(
+                filtered_df,
+                width='stretch',
+                column_config={
+                    'StockName': st.column_config.Column('Stock Name'),
+                    'StockSymbol': st.column_config.Column('Symbol'),
+                    'DateOfTrade': st.column_config.DateColumn('Date', format='YYYY-MM-DD'),
+                    'TradeType': st.column_config.Column('Type'),
+                    'SharesTraded': st.column_config.NumberColumn('Shares', format='localized'),
+                    'PricePerShare': st.column_config.NumberColumn('Price/Share', format='dollar'),
+                    'Commission': st.column_config.NumberColumn('Commission', format='dollar')
+                }
+            )
             
             # Summary statistics
             st.subheader("Summary")
+            totals = filtered_df[['SharesTraded', 'Commission']].sum()
             col1, col2, col3 = st.columns(3)
             
             with col1:
@@ -684,203 +1040,190 @@ elif page == "Trade History":
                 st.metric("Total Trades", total_trades)
             
             with col2:
-                total_shares = filtered_df['SharesTraded'].sum()
+                total_shares = totals['SharesTraded']
                 st.metric("Total Shares Traded", format_number(total_shares))
             
             with col3:
-                total_commission = filtered_df['Commission'].sum()
+                total_commission = totals['Commission']
                 st.metric("Total Commission", format_currency(total_commission))
         else:
             st.info("No trades match the selected filters.")
 
 # Page 5: Stock Charts
-elif page == "Stock Charts":
-    st.title("Stock Charts")
-    st.markdown("Live stock charts for your holdings")
+@st.fragment
+def render_stock_chart(meta, symbols, symbol_labels):
+    """Chart for the selected symbol; changing its widgets reruns only this fragment."""
+    # Timeframe selection
+    col1, col2 = st.columns([1, 3])
     
-    # Load consolidated data
-    df = data_manager.read_consolidated()
+    with col1:
+        timeframe = st.selectbox(
+            "Timeframe",
+            ["1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "max"],
+            index=2  # Default to 1mo
+        )
     
-    if df.empty:
-        st.info("No holdings found. Add some stocks to your portfolio to see charts.")
-    else:
-        # Get unique stock symbols from holdings
-        symbols = df['StockSymbol'].unique().tolist()
+    with col2:
+        selected_symbol = st.selectbox(
+            "Select Stock",
+            symbols,
+            format_func=symbol_labels.get
+        )
+    
+    with st.spinner(f"Loading {selected_symbol} data..."):
+        data, info = get_stock_data(selected_symbol, timeframe)
+    
+    if data is not None and not data.empty:
+        holding = meta.loc[selected_symbol]
+        
+        # Get current price and change
+        current_price = data['Close'].iloc[-1]
+        prev_close = data['Close'].iloc[-2] if len(data) > 1 else current_price
+        price_change = current_price - prev_close
+        price_change_pct = (price_change / prev_close) * 100
         
-        # Timeframe selection
-        col1, col2 = st.columns([1, 3])
+        # Display current price info
+        col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            timeframe = st.selectbox(
-                "Timeframe",
-                ["1d", "5d", "1mo", "3mo", "6mo", "1y", "2y", "5y", "max"],
-                index=2  # Default to 1mo
-            )
+            st.metric("Current Price", f"${current_price:.2f}")
         
         with col2:
-            selected_symbol = st.selectbox(
-                "Select Stock",
-                symbols,
-                format_func=lambda x: f"{x} - {df[df['StockSymbol']==x]['StockName'].iloc[0]}"
-            )
+            st.metric("Change", f"${price_change:.2f}", f"{price_change_pct:.2f}%")
         
-        # Fetch stock data
-        @st.cache_data(ttl=300)  # Cache for 5 minutes
-        def get_stock_data(symbol, period):
-            try:
-                ticker = yf.Ticker(symbol)
-                data = ticker.history(period=period)
-                
-                if data.empty:
-                    st.warning(f"No data available for {symbol} with period {period}")
-                    return None, None
-                
-                info = ticker.info
-                return data, info
-            except Exception as e:
-                st.error(f"Error fetching data for {symbol}: {e}")
-                return None, None
-        
-        with st.spinner(f"Loading {selected_symbol} data..."):
-            data, info = get_stock_data(selected_symbol, timeframe)
-        
-        if data is not None and not data.empty:
-            # Get current price and change
-            current_price = data['Close'].iloc[-1]
-            prev_close = data['Close'].iloc[-2] if len(data) > 1 else current_price
-            price_change = current_price - prev_close
-            price_change_pct = (price_change / prev_close) * 100
-            
-            # Display current price info
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                st.metric("Current Price", f"${current_price:.2f}")
-            
-            with col2:
-                st.metric("Change", f"${price_change:.2f}", f"{price_change_pct:.2f}%")
-            
-            with col3:
-                # Get holding info
-                holding = df[df['StockSymbol'] == selected_symbol].iloc[0]
-                st.metric("Your Shares", f"{holding['Quantity']:.0f}")
-            
-            with col4:
-                total_value = holding['Quantity'] * current_price
-                st.metric("Total Value", f"${total_value:,.2f}")
-            
-            # Create charts using helper functions
-            stock_name = df[df['StockSymbol']==selected_symbol]['StockName'].iloc[0]
-            fig = create_price_chart(data, selected_symbol, stock_name, timeframe)
-            st.plotly_chart(fig, use_container_width=True)
-            
-            # Volume chart
-            if 'Volume' in data.columns:
-                fig_volume = create_volume_chart(data, selected_symbol, timeframe)
-                st.plotly_chart(fig_volume, use_container_width=True)
-            
-            # Portfolio performance section
-            st.subheader("Portfolio Performance")
-            
-            # Calculate portfolio performance for this stock
-            holding = df[df['StockSymbol'] == selected_symbol].iloc[0]
-            avg_cost = holding['AveragePricePerShare']
-            shares = holding['Quantity']
-            cost_basis = shares * avg_cost
-            current_value = shares * current_price
-            unrealized_gain = current_value - cost_basis
-            unrealized_gain_pct = (unrealized_gain / cost_basis) * 100
-            
-            col1, col2, col3 = st.columns(3)
+        with col3:
+            st.metric("Your Shares", f"{holding['Quantity']:.0f}")
+        
+        with col4:
+            total_value = holding['Quantity'] * current_price
+            st.metric("Total Value", f"${total_value:,.2f}")
+        
+        # Create charts using helper functions (price and volume share one figure)
+        chart_columns = [col for col in ('Close', 'Volume') if col in data.columns]
+        fig_json = get_price_figure_json(
+            selected_symbol, holding['StockName'], timeframe,
+            data.index.asi8.tobytes(), data[chart_columns].to_numpy().tobytes(), data
+        )
+        st.plotly_chart(json.loads(fig_json), use_container_width=True)
+        
+        # Portfolio performance section
+        st.subheader("Portfolio Performance")
+        
+        # Calculate portfolio performance for this stock
+        avg_cost = holding['AveragePricePerShare']
+        shares = holding['Quantity']
+        cost_basis = shares * avg_cost
+        current_value = shares * current_price
+        unrealized_gain = current_value - cost_basis
+        unrealized_gain_pct = (unrealized_gain / cost_basis) * 100
+        
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            st.metric("Cost Basis", f"${cost_basis:,.2f}")
+        
+        with col2:
+            st.metric("Current Value", f"${current_value:,.2f}")
+        
+        with col3:
+            st.metric("Unrealized Gain/Loss", f"${unrealized_gain:,.2f}", f"{unrealized_gain_pct:.2f}%")
+        
+        # Stock info
+        if info:
+            st.subheader("Stock Information")
+            col1, col2 = st.columns(2)
             
             with col1:
-                st.metric("Cost Basis", f"${cost_basis:,.2f}")
+                if 'marketCap' in info:
+                    market_cap = info['marketCap'] / 1e9  # Convert to billions
+                    st.metric("Market Cap", f"${market_cap:.1f}B")
+                
+                if 'peRatio' in info and info['peRatio']:
+                    st.metric("P/E Ratio", f"{info['peRatio']:.2f}")
             
             with col2:
-                st.metric("Current Value", f"${current_value:,.2f}")
-            
-            with col3:
-                st.metric("Unrealized Gain/Loss", f"${unrealized_gain:,.2f}", f"{unrealized_gain_pct:.2f}%")
-            
-            # Stock info
-            if info:
-                st.subheader("Stock Information")
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    if 'marketCap' in info:
-                        market_cap = info['marketCap'] / 1e9  # Convert to billions
-                        st.metric("Market Cap", f"${market_cap:.1f}B")
-                    
-                    if 'peRatio' in info and info['peRatio']:
-                        st.metric("P/E Ratio", f"{info['peRatio']:.2f}")
+                if 'dividendYield' in info and info['dividendYield']:
+                    dividend_yield = info['dividendYield'] * 100
+                    st.metric("Dividend Yield", f"{dividend_yield:.2f}%")
                 
-                with col2:
-                    if 'dividendYield' in info and info['dividendYield']:
-                        dividend_yield = info['dividendYield'] * 100
-                        st.metric("Dividend Yield", f"{dividend_yield:.2f}%")
-                    
-                    if 'beta' in info and info['beta']:
-                        st.metric("Beta", f"{info['beta']:.2f}")
+                if 'beta' in info and info['beta']:
+                    st.metric("Beta", f"{info['beta']:.2f}")
+    
+    else:
+        st.error(f"Could not fetch data for {selected_symbol}. Please check the symbol and try again.")
+
+@st.fragment
+def render_portfolio_overview(symbols, prices_future):
+    """Portfolio-wide summary, kept separate so chart widget changes don't recompute it."""
+    # Portfolio overview
+    st.subheader("Portfolio Overview")
+    
+    # Create a simple portfolio performance chart
+    current_prices = prices_future.result()
+    portfolio_df = load_portfolio_view(current_prices)
+    
+    # Holdings without a price are left out of the totals; say so instead of hiding it
+    missing = [symbol for symbol in symbols if symbol not in current_prices]
+    if missing:
+        st.warning(f"No current price available for: {', '.join(missing)}. These holdings are not included below.")
+    
+    if not portfolio_df.empty:
+        # Portfolio summary (totals are inner products of shares with cost and price)
+        shares = portfolio_df['Shares'].to_numpy(dtype=float)
+        total_cost_basis = np.dot(shares, portfolio_df['Avg Cost'].to_numpy(dtype=float))
+        total_current_value = np.dot(shares, portfolio_df['Current Price'].to_numpy(dtype=float))
+        total_gain_loss = total_current_value - total_cost_basis
+        total_gain_loss_pct = (total_gain_loss / total_cost_basis) * 100
         
-        else:
-            st.error(f"Could not fetch data for {selected_symbol}. Please check the symbol and try again.")
+        col1, col2, col3, col4 = st.columns(4)
         
-        # Portfolio overview
-        st.subheader("Portfolio Overview")
+        with col1:
+            st.metric("Total Cost Basis", f"${total_cost_basis:,.2f}")
         
-        # Create a simple portfolio performance chart
-        portfolio_data = []
-        for symbol in symbols:
-            holding = df[df['StockSymbol'] == symbol].iloc[0]
-            try:
-                ticker = yf.Ticker(symbol)
-                data = ticker.history(period="1d")
-                if not data.empty:
-                    current_price = data['Close'].iloc[-1]
-                else:
-                    continue
-                portfolio_data.append({
-                    'Symbol': symbol,
-                    'Shares': holding['Quantity'],
-                    'Avg Cost': holding['AveragePricePerShare'],
-                    'Current Price': current_price,
-                    'Cost Basis': holding['Quantity'] * holding['AveragePricePerShare'],
-                    'Current Value': holding['Quantity'] * current_price,
-                    'Gain/Loss': (holding['Quantity'] * current_price) - (holding['Quantity'] * holding['AveragePricePerShare'])
-                })
-            except:
-                continue
+        with col2:
+            st.metric("Total Current Value", f"${total_current_value:,.2f}")
         
-        if portfolio_data:
-            portfolio_df = pd.DataFrame(portfolio_data)
-            
-            # Portfolio summary
-            total_cost_basis = portfolio_df['Cost Basis'].sum()
-            total_current_value = portfolio_df['Current Value'].sum()
-            total_gain_loss = total_current_value - total_cost_basis
-            total_gain_loss_pct = (total_gain_loss / total_cost_basis) * 100
-            
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                st.metric("Total Cost Basis", f"${total_cost_basis:,.2f}")
-            
-            with col2:
-                st.metric("Total Current Value", f"${total_current_value:,.2f}")
-            
-            with col3:
-                st.metric("Total Gain/Loss", f"${total_gain_loss:,.2f}")
-            
-            with col4:
-                st.metric("Total Return", f"{total_gain_loss_pct:.2f}%")
-            
-            # Portfolio allocation pie chart
-            fig_pie = px.pie(
-                portfolio_df, 
-                values='Current Value', 
-                names='Symbol',
-                title="Portfolio Allocation by Value"
-            )
-            st.plotly_chart(fig_pie, use_container_width=True)
+        with col3:
+            st.metric("Total Gain/Loss", f"${total_gain_loss:,.2f}")
+        
+        with col4:
+            st.metric("Total Return", f"{total_gain_loss_pct:.2f}%")
+        
+        # Portfolio allocation pie chart
+        fig_pie_json = get_allocation_figure_json(
+            tuple(portfolio_df['Symbol']), tuple(portfolio_df['Current Value'])
+        )
+        st.plotly_chart(json.loads(fig_pie_json), use_container_width=True)
 
+def render_stock_charts():
+    st.title("Stock Charts")
+    st.markdown("Live stock charts for your holdings")
+    
+    # Load consolidated data
+    df = load_consolidated()
+    
+    if df.empty:
+        st.info("No holdings found. Add some stocks to your portfolio to see charts.")
+    else:
+        # Per-symbol lookup table (first holding of each symbol) instead of repeated mask scans
+        meta = df.drop_duplicates('StockSymbol').set_index('StockSymbol')
+        symbols = meta.index.tolist()
+        symbol_labels = {symbol: f"{symbol} - {meta.at[symbol, 'StockName']}" for symbol in symbols}
+        
+        # Start the overview's price download now so it overlaps the chart data fetch below
+        prices_future = submit_fetch(get_current_prices, tuple(sorted(symbols)))
+        
+        render_stock_chart(meta, symbols, symbol_labels)
+        render_portfolio_overview(symbols, prices_future)
+
+# Render the selected page
+if page == "Consolidated Record":
+    render_consolidated_record()
+elif page == "Trade Entry":
+    render_trade_entry()
+elif page == "Pre-populate Database":
+    render_prepopulate_database()
+elif page == "Trade History":
+    render_trade_history()
+elif page == "Stock Charts":
+    render_stock_charts()
@@ -0,0 +1,192 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import calculations
+from utils.data_manager import DataManager
+from utils.calculations import TradeCalculator, replay_trades
+
+ACCOUNTS = ["TFSA", "RRSP"]
+SYMBOLS = ["AAA", "BBB", "CCC"]
+
+def random_holdings(rng: random.Random) -> list:
+    """Pre-populated holdings for a random subset of accounts and symbols."""
+    return [
+        {
+            'Account': account,
+            'StockName': f"{symbol} Inc",
+            'StockSymbol': symbol,
+            'Quantity': rng.randint(1, 50),
+            'BookCost': rng.uniform(100, 5000),
+            'DateOfAcquisition': '2023-01-01'
+        }
+        for account in ACCOUNTS
+        for symbol in SYMBOLS
+        if rng.random() < 0.4
+    ]
+
+def random_trades(rng: random.Random, holdings: list) -> list:
+    """
+    Random buys, sells and transfers on top of `holdings`. Sells are drawn within
+    the current position and often sell it out, so later buys rebuild it.
+    """
+    held = {(h['Account'], h['StockSymbol']): h['Quantity'] for h in holdings}
+    trades = []
+    for i in range(rng.randint(0, 60)):
+        account = rng.choice(ACCOUNTS)
+        symbol = rng.choice(SYMBOLS)
+        quantity = held.get((account, symbol), 0)
+        trade_type = rng.choice("BBSST")
+        if trade_type == 'S':
+            if quantity == 0:
+                continue
+            shares = rng.choice([quantity, rng.randint(1, quantity)])
+        else:
+            shares = rng.randint(1, 40)
+        trades.append({
+            'Account': account,
+            'StockName': f"{symbol} Inc",
+            'StockSymbol': symbol,
+            'DateOfTrade': f"2024-01-{1 + i % 28:02d}",
+            'TradeType': trade_type,
+            'SharesTraded': shares,
+            'PricePerShare': round(rng.uniform(5, 300), 2),
+            'Commission': rng.choice([0, 4.99, 9.99])
+        })
+        if trade_type == 'B':
+            held[(account, symbol)] = quantity + shares
+        elif trade_type == 'S':
+            held[(account, symbol)] = quantity - shares
+    return trades
+
+def prepopulate(calculator: TradeCalculator, holdings: list):
+    for holding in holdings:
+        ok, msg = calculator.add_existing_holding(holding)
+        assert ok, msg
+
+def process_one_at_a_time(calculator: TradeCalculator, trades: list):
+    for trade in trades:
+        ok, msg = calculator.process_trade(dict(trade))
+        assert ok, msg
+
+def assert_same_holdings(expected: pd.DataFrame, actual: pd.DataFrame):
+    """Compare two consolidated records regardless of row order."""
+    keys = ['Account', 'StockSymbol']
+    expected = expected.astype({k: str for k in keys}).sort_values(keys).reset_index(drop=True)
+    actual = actual.astype({k: str for k in keys}).sort_values(keys).reset_index(drop=True)
+
+    assert len(expected) == len(actual)
+    assert (expected[keys] == actual[keys]).all().all()
+    assert (expected['StockName'].astype(str) == actual['StockName'].astype(str)).all()
+    assert (expected['Quantity'].to_numpy() == actual['Quantity'].to_numpy()).all()
+    assert (
+        pd.to_datetime(expected['DateOfAcquisition']).to_numpy()
+        == pd.to_datetime(actual['DateOfAcquisition']).to_numpy()
+    ).all()
+    for column in ['AveragePricePerShare', 'CapitalGainLoss']:
+        np.testing.assert_allclose(actual[column], expected[column], rtol=0, atol=0.02)
+
+@pytest.fixture(params=[False, True], ids=["vectorized", "compiled"])
+def replay_path(request, monkeypatch):
+    """
+    Run replay_trades through each implementation. Without numba installed the
+    compiled path runs the kernel as plain Python through the njit stand-in.
+    """
+    monkeypatch.setattr(calculations, "HAVE_NUMBA", request.param)
+    return request.param
+
+@pytest.mark.parametrize("seed", range(40))
+def test_replay_matches_sequential_processing(tmp_path, replay_path, seed):
+    rng = random.Random(seed)
+    calculator = TradeCalculator(DataManager(str(tmp_path)))
+    prepopulate(calculator, random_holdings(rng))
+    opening = calculator.data_manager.read_consolidated()
+    process_one_at_a_time(calculator, random_trades(rng, opening.to_dict('records')))
+
+    replayed = replay_trades(calculator.data_manager.read_trades(), opening)
+
+    assert_same_holdings(calculator.data_manager.read_consolidated(), replayed)
+
+def test_replay_restarts_cost_basis_after_sell_out(replay_path):
+    trades = pd.DataFrame([
+        {'Account': 'TFSA', 'StockName': 'AAA Inc', 'StockSymbol': 'AAA', 'DateOfTrade': '2024-01-01',
+         'TradeType': 'B', 'SharesTraded': 10, 'PricePerShare': 10.0, 'Commission': 0.0},
+        {'Account': 'TFSA', 'StockName': 'AAA Inc', 'StockSymbol': 'AAA', 'DateOfTrade': '2024-01-02',
+         'TradeType': 'S', 'SharesTraded': 10, 'PricePerShare': 15.0, 'Commission': 0.0},
+        {'Account': 'TFSA', 'StockName': 'AAA Inc', 'StockSymbol': 'AAA', 'DateOfTrade': '2024-01-03',
+         'TradeType': 'T', 'SharesTraded': 5, 'PricePerShare': 99.0, 'Commission': 0.0},
+        {'Account': 'TFSA', 'StockName': 'AAA Inc', 'StockSymbol': 'AAA', 'DateOfTrade': '2024-01-04',
+         'TradeType': 'B', 'SharesTraded': 4, 'PricePerShare': 20.0, 'Commission': 0.0},
+    ])
+
+    replayed = replay_trades(trades)
+
+    assert len(replayed) == 1
+    record = replayed.iloc[0]
+    assert record['Quantity'] == 4
+    assert record['AveragePricePerShare'] == pytest.approx(20.0)
+    assert record['CapitalGainLoss'] == pytest.approx(50.0)
+
+@pytest.mark.parametrize("seed", range(30))
+def test_process_trades_matches_sequential_processing(tmp_path, seed):
+    rng = random.Random(seed)
+    holdings = random_holdings(rng)
+    trades = random_trades(rng, holdings)
+    sequential = TradeCalculator(DataManager(str(tmp_path / "sequential")))
+    batched = TradeCalculator(DataManager(str(tmp_path / "batched")))
+    prepopulate(sequential, holdings)
+    prepopulate(batched, holdings)
+
+    process_one_at_a_time(sequential, trades)
+    ok, msg = batched.process_trades([dict(trade) for trade in trades])
+
+    assert ok, msg
+    assert_same_holdings(sequential.data_manager.read_consolidated(), batched.data_manager.read_consolidated())
+    assert len(batched.data_manager.read_trades()) == len(trades)
+
+def test_process_trades_records_normalized_trades(tmp_path):
+    calculator = TradeCalculator(DataManager(str(tmp_path)))
+
+    ok, msg = calculator.process_trades([
+        {'Account': 'TFSA', 'StockName': 'AAA Inc', 'StockSymbol': 'AAA', 'DateOfTrade': '2024-01-01',
+         'TradeType': 'b', 'SharesTraded': '10', 'PricePerShare': 10},
+    ])
+
+    assert ok, msg
+    trade = calculator.data_manager.read_trades().iloc[0]
+    assert trade['TradeType'] == 'B'
+    assert trade['SharesTraded'] == 10
+    assert trade['Commission'] == 0
+    assert calculator.data_manager.get_consolidated_record('TFSA', 'AAA')['Quantity'] == 10
+
+@pytest.mark.parametrize("changes", [
+    {'TradeType': 'S', 'SharesTraded': 6},
+    {'TradeType': 'X'},
+    {'Account': ''},
+    {'Account': None},
+    {'StockSymbol': '  '},
+    {'SharesTraded': 0},
+    {'TradeType': 'S', 'SharesTraded': -3},
+    {'SharesTraded': 2.5},
+    {'PricePerShare': -10.0},
+    {'PricePerShare': None},
+    {'Commission': -1.0},
+    {'DateOfTrade': 'not a date'},
+], ids=[
+    "oversell", "unknown-type", "blank-account", "missing-account", "blank-symbol", "zero-shares",
+    "negative-sell", "fractional-shares", "negative-price", "missing-price", "negative-commission", "bad-date",
+])
+def test_invalid_batch_records_nothing(tmp_path, changes):
+    calculator = TradeCalculator(DataManager(str(tmp_path)))
+    trade = {'Account': 'TFSA', 'StockName': 'AAA Inc', 'StockSymbol': 'AAA', 'DateOfTrade': '2024-01-01',
+             'TradeType': 'B', 'SharesTraded': 5, 'PricePerShare': 10.0, 'Commission': 0.0}
+
+    ok, msg = calculator.process_trades([trade, {**trade, 'DateOfTrade': '2024-01-02', **changes}])
+
+    assert not ok
+    if changes.get('TradeType') != 'X':
+        assert "(trade 2 of 2)" in msg
+    assert calculator.data_manager.read_trades().empty
+    assert calculator.data_manager.read_consolidated().empty
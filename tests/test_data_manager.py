@@ -0,0 +1,18 @@
+import pandas as pd
+
+from utils.data_manager import DataManager
+
+def test_column_subset_reads_match_cached_reads(tmp_path):
+    writer = DataManager(str(tmp_path))
+    writer.write_trades(pd.DataFrame([
+        {'Account': 'TFSA', 'StockName': 'AAA Inc', 'StockSymbol': 'AAA', 'DateOfTrade': '2024-01-01',
+         'TradeType': 'B', 'SharesTraded': 10, 'PricePerShare': 10.0, 'Commission': 0.0},
+    ]))
+    columns = ['Account', 'SharesTraded']
+
+    # A fresh DataManager has nothing cached, so the subset comes straight from the file
+    from_file = DataManager(str(tmp_path)).read_trades(columns=columns)
+    from_cache = writer.read_trades(columns=columns)
+
+    assert list(from_file.columns) == columns
+    pd.testing.assert_frame_equal(from_file, from_cache)
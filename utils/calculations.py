@@ -1,7 +1,130 @@
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
 import streamlit as st
 from datetime import datetime
-from .data_manager import DataManager
+from .data_manager import DataManager, CONSOLIDATED_COLUMNS
+from .kernels import HAVE_NUMBA, EVENT_OPENING, EVENT_BUY, EVENT_SELL, replay_holdings
+
+def replay_trades(trades: pd.DataFrame, opening: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Rebuild consolidated holdings from a trade history in one vectorized pass.
+    
+    Applies the buy/sell formulas of TradeCalculator to every trade in the order it
+    was recorded, starting from the `opening` consolidated holdings if given. Transfers
+    don't change holdings. The history is assumed valid (no sell exceeds the position).
+    Returns one row per (Account, StockSymbol) with the consolidated columns.
+    
+    Cost basis follows C[i] = keep[i] * C[i-1] + cost[i], where keep is the fraction of
+    the position left after a sell (1 for buys) and cost is the buy cost (0 for sells).
+    With P = cumprod(keep), this is C = P * cumsum(cost / P), computed separately for
+    each run between positions being sold down to zero so P never divides by zero.
+    """
+    keys = ['Account', 'StockSymbol']
+    trades = trades[trades['TradeType'].isin(['B', 'S'])]
+    is_buy = (trades['TradeType'] == 'B').to_numpy()
+    shares = trades['SharesTraded'].to_numpy(dtype=float)
+    price = trades['PricePerShare'].to_numpy(dtype=float)
+    commission = trades['Commission'].fillna(0).to_numpy(dtype=float)
+    
+    events = pd.DataFrame({
+        'Account': trades['Account'].to_numpy(),
+        'StockSymbol': trades['StockSymbol'].to_numpy(),
+        'StockName': trades['StockName'].to_numpy(),
+        'Date': trades['DateOfTrade'].to_numpy(),
+        'Kind': np.where(is_buy, EVENT_BUY, EVENT_SELL).astype(np.int8),
+        'Shares': np.where(is_buy, shares, -shares),
+        'Cost': np.where(is_buy, shares * price + commission, 0.0),
+        'Proceeds': np.where(is_buy, 0.0, shares * price - commission),
+        'OpeningAvg': np.nan,
+        'OpeningGain': 0.0
+    })
+    if opening is not None and not opening.empty:
+        # Opening holdings act as a first buy carrying their existing average and gain/loss
+        quantity = opening['Quantity'].to_numpy(dtype=float)
+        avg_price = opening['AveragePricePerShare'].to_numpy(dtype=float)
+        opening_events = pd.DataFrame({
+            'Account': opening['Account'].to_numpy(),
+            'StockSymbol': opening['StockSymbol'].to_numpy(),
+            'StockName': opening['StockName'].to_numpy(),
+            'Date': opening['DateOfAcquisition'].to_numpy(),
+            'Kind': np.int8(EVENT_OPENING),
+            'Shares': quantity,
+            'Cost': quantity * avg_price,
+            'Proceeds': 0.0,
+            'OpeningAvg': avg_price,
+            'OpeningGain': opening['CapitalGainLoss'].fillna(0).to_numpy(dtype=float)
+        })
+        events = pd.concat([opening_events, events], ignore_index=True)
+    
+    if events.empty:
+        return pd.DataFrame(columns=CONSOLIDATED_COLUMNS)
+    
+    # Stable sort groups each holding's events together while keeping recorded order
+    events = events.sort_values(keys, kind='stable', ignore_index=True)
+    by_holding = events.groupby(keys, sort=False)
+    result = by_holding.agg(
+        StockName=('StockName', 'last'),
+        DateOfAcquisition=('Date', 'first')
+    ).reset_index()
+    
+    if HAVE_NUMBA:
+        quantity, avg_price, gain_loss = _replay_compiled(events, by_holding)
+    else:
+        quantity, avg_price, gain_loss = _replay_vectorized(events, keys)
+    
+    result['Quantity'] = np.round(quantity).astype('int64')
+    result['AveragePricePerShare'] = avg_price
+    result['CapitalGainLoss'] = gain_loss
+    return result[CONSOLIDATED_COLUMNS]
+
+def _replay_compiled(events: pd.DataFrame, by_holding) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Final quantity, average price and gain/loss per holding, via the compiled replay loop."""
+    # Events are sorted by holding, so each group is a contiguous run of positions
+    codes = by_holding.ngroup().to_numpy()
+    groups = np.split(np.arange(len(events)), np.flatnonzero(np.diff(codes)) + 1)
+    selling = events['Kind'].to_numpy() == EVENT_SELL
+    return replay_holdings(
+        events['Kind'].to_numpy(),
+        np.abs(events['Shares'].to_numpy()),
+        np.where(selling, events['Proceeds'].to_numpy(), events['Cost'].to_numpy()),
+        np.nan_to_num(events['OpeningAvg'].to_numpy()),
+        events['OpeningGain'].to_numpy(),
+        groups
+    )
+
+def _replay_vectorized(events: pd.DataFrame, keys: list) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Final quantity, average price and gain/loss per holding, using grouped NumPy/pandas ops."""
+    holding = [events[k] for k in keys]
+    quantity = events.groupby(holding, sort=False)['Shares'].cumsum().to_numpy()
+    before = quantity - events['Shares'].to_numpy()
+    selling = events['Kind'].to_numpy() == EVENT_SELL
+    keep = np.ones(len(events))
+    np.divide(quantity, before, out=keep, where=selling & (before > 0))
+    
+    # A new run starts whenever the position was empty before the event
+    run = pd.Series(before <= 0).groupby(holding, sort=False).cumsum()
+    runs = holding + [run]
+    kept = pd.Series(keep).groupby(runs, sort=False).cumprod().to_numpy()
+    cost = events['Cost'].to_numpy()
+    scaled = np.zeros(len(events))
+    np.divide(cost, kept, out=scaled, where=cost != 0)
+    basis = kept * pd.Series(scaled).groupby(runs, sort=False).cumsum().to_numpy()
+    
+    # Average cost is unchanged by sells, and kept through a sell-out for the next buy
+    avg = np.full(len(events), np.nan)
+    np.divide(basis, quantity, out=avg, where=quantity > 0)
+    avg = np.where(np.isnan(avg), events['OpeningAvg'].to_numpy(), avg)
+    avg = pd.Series(avg).groupby(holding, sort=False).ffill()
+    avg_before = avg.groupby(holding, sort=False).shift(1).fillna(0).to_numpy()
+    
+    gain = np.where(selling, events['Proceeds'].to_numpy() + events['Shares'].to_numpy() * avg_before, 0.0)
+    gain = gain + events['OpeningGain'].to_numpy()
+    
+    totals = pd.DataFrame({'Quantity': quantity, 'Avg': avg.fillna(0).to_numpy(), 'Gain': gain})
+    by_holding = totals.groupby(holding, sort=False)
+    final = by_holding[['Quantity', 'Avg']].last()
+    return final['Quantity'].to_numpy(), final['Avg'].to_numpy(), by_holding['Gain'].sum().to_numpy()
 
 class TradeCalculator:
     """Handles all trade calculations according to the specified formulas."""
@@ -30,22 +153,22 @@ class TradeCalculator:
             existing_record = self.data_manager.get_consolidated_record(account, stock_symbol)
             
             if existing_record:
-                # Existing stock - update calculations
-                current_quantity = int(existing_record['Quantity'])
-                current_avg_price = float(existing_record['AveragePricePerShare'])
-                current_capital_gain_loss = float(existing_record.get('CapitalGainLoss', 0))
+                # Existing stock - update calculations (record values are already typed)
+                current_quantity = existing_record['Quantity']
+                current_avg_price = existing_record['AveragePricePerShare']
+                current_capital_gain_loss = existing_record.get('CapitalGainLoss', 0)
                 
                 # Calculate new values
                 cost_of_trade = (shares_traded * price_per_share) + commission
                 total_cost_existing = current_quantity * current_avg_price
-                new_quantity = int(current_quantity + shares_traded)
+                new_quantity = current_quantity + shares_traded
                 new_avg_price = (total_cost_existing + cost_of_trade) / new_quantity
                 
-                # Update consolidated record
+                # Update consolidated record (stored values are rounded when written)
                 updated_data = {
                     'StockName': trade_data['StockName'],
-                    'Quantity': int(new_quantity),
-                    'AveragePricePerShare': round(new_avg_price, 4),
+                    'Quantity': new_quantity,
+                    'AveragePricePerShare': new_avg_price,
                     'CapitalGainLoss': current_capital_gain_loss,  # No change for buy
                     'DateOfAcquisition': existing_record['DateOfAcquisition']  # Keep original date
                 }
@@ -57,8 +180,8 @@ class TradeCalculator:
                 
                 updated_data = {
                     'StockName': trade_data['StockName'],
-                    'Quantity': int(shares_traded),
-                    'AveragePricePerShare': round(new_avg_price, 4),
+                    'Quantity': shares_traded,
+                    'AveragePricePerShare': new_avg_price,
                     'CapitalGainLoss': 0,
                     'DateOfAcquisition': trade_data['DateOfTrade']
                 }
@@ -69,7 +192,7 @@ class TradeCalculator:
             )
             
             if success:
-                return True, f"Buy trade processed successfully. New quantity: {updated_data['Quantity']}, New avg price: {updated_data['AveragePricePerShare']:.4f}"
+                return True, f"Buy trade processed successfully. New quantity: {updated_data['Quantity']}, New avg price: {new_avg_price:.4f}"
             else:
                 return False, "Failed to update consolidated record"
                 
@@ -98,9 +221,10 @@ class TradeCalculator:
             if not existing_record:
                 return False, f"No existing holdings found for {stock_symbol} in {account}"
             
-            current_quantity = int(existing_record['Quantity'])
-            current_avg_price = float(existing_record['AveragePricePerShare'])
-            current_capital_gain_loss = float(existing_record.get('CapitalGainLoss', 0))
+            # Record values are already typed
+            current_quantity = existing_record['Quantity']
+            current_avg_price = existing_record['AveragePricePerShare']
+            current_capital_gain_loss = existing_record.get('CapitalGainLoss', 0)
             
             # Validate sufficient shares
             if shares_traded > current_quantity:
@@ -109,15 +233,15 @@ class TradeCalculator:
             # Calculate new values
             net_proceeds = (shares_traded * price_per_share) - commission
             trade_capital_gain_loss = net_proceeds - (shares_traded * current_avg_price)
-            new_quantity = int(current_quantity - shares_traded)
+            new_quantity = current_quantity - shares_traded
             new_capital_gain_loss = current_capital_gain_loss + trade_capital_gain_loss
             
-            # Update consolidated record
+            # Update consolidated record (stored values are rounded when written)
             updated_data = {
                 'StockName': trade_data['StockName'],
-                'Quantity': int(new_quantity),
+                'Quantity': new_quantity,
                 'AveragePricePerShare': current_avg_price,  # No change for sell
-                'CapitalGainLoss': round(new_capital_gain_loss, 2),
+                'CapitalGainLoss': new_capital_gain_loss,
                 'DateOfAcquisition': existing_record['DateOfAcquisition']  # Keep original date
             }
             
@@ -155,16 +279,99 @@ class TradeCalculator:
         if not trade_success:
             return False, "Failed to record trade in trade history"
         
+        # Transfers only need the history entry, so skip the consolidated record entirely
+        if trade_type == 'T':
+            return self.process_transfer_trade(trade_data)
+        
         # Then process based on trade type
         if trade_type == 'B':
             return self.process_buy_trade(trade_data)
         elif trade_type == 'S':
             return self.process_sell_trade(trade_data)
-        elif trade_type == 'T':
-            return self.process_transfer_trade(trade_data)
         else:
             return False, f"Unknown trade type: {trade_type}. Use B (Buy), S (Sell), or T (Transfer)"
     
+    def process_trades(self, trades: List[Dict]) -> Tuple[bool, str]:
+        """
+        Process several trades at once.
+        
+        The trade history and the consolidated record are each written once, and the
+        affected holdings are updated with replay_trades starting from their current
+        records. Nothing is written if any trade is invalid.
+        """
+        try:
+            if not trades:
+                return True, "No trades to process"
+            
+            trades_df = pd.DataFrame(trades)
+            if 'Commission' not in trades_df.columns:
+                trades_df['Commission'] = 0.0
+            for col in ['Account', 'StockSymbol']:
+                trades_df[col] = trades_df[col].fillna('').astype(str).str.strip()
+            trades_df['TradeType'] = trades_df['TradeType'].fillna('').astype(str).str.upper()
+            shares = pd.to_numeric(trades_df['SharesTraded'], errors='coerce')
+            price = pd.to_numeric(trades_df['PricePerShare'], errors='coerce')
+            commission = pd.to_numeric(trades_df['Commission'], errors='coerce').fillna(0)
+            trade_date = pd.to_datetime(trades_df['DateOfTrade'], errors='coerce', format='mixed')
+            
+            unknown = sorted(set(trades_df['TradeType']) - {'B', 'S', 'T'})
+            if unknown:
+                return False, f"Unknown trade type: {', '.join(unknown)}. Use B (Buy), S (Sell), or T (Transfer)"
+            
+            # The same checks the trade entry form applies, reported for the first bad trade
+            checks = [
+                (trades_df['Account'] == '', "Account is missing"),
+                (trades_df['StockSymbol'] == '', "Stock symbol is missing"),
+                (~(shares >= 1) | (shares % 1 != 0), "Shares traded must be a whole number of at least 1"),
+                (~(price > 0), "Price per share must be greater than 0"),
+                (commission < 0, "Commission cannot be negative"),
+                (trade_date.isna(), "Date of trade is missing or invalid"),
+            ]
+            failures = [(int(bad.to_numpy().argmax()), problem) for bad, problem in checks if bad.any()]
+            if failures:
+                row, problem = min(failures)
+                return False, f"{problem} (trade {row + 1} of {len(trades_df)})"
+            
+            trades_df['SharesTraded'] = shares.astype(int)
+            trades_df['PricePerShare'] = price.astype(float)
+            trades_df['Commission'] = commission.astype(float)
+            
+            # Current records of the holdings that buys and sells touch
+            keys = ['Account', 'StockSymbol']
+            affected = trades_df.loc[trades_df['TradeType'] != 'T', keys].drop_duplicates()
+            records = [
+                self.data_manager.get_consolidated_record(account, stock_symbol)
+                for account, stock_symbol in affected.itertuples(index=False)
+            ]
+            opening = pd.DataFrame([record for record in records if record])
+            
+            # Validate sufficient shares at every sell, in the order the trades were given
+            signed = trades_df['SharesTraded'].where(trades_df['TradeType'] == 'B', -trades_df['SharesTraded'])
+            signed = signed.where(trades_df['TradeType'] != 'T', 0)
+            start = {}
+            if not opening.empty:
+                start = dict(zip(zip(opening['Account'], opening['StockSymbol']), opening['Quantity']))
+            held = signed.groupby([trades_df[k] for k in keys], sort=False).cumsum()
+            held += [start.get(key, 0) for key in zip(trades_df['Account'], trades_df['StockSymbol'])]
+            short = held < 0
+            if short.any():
+                trade = trades_df[short].iloc[0]
+                return False, f"Insufficient shares for {trade['StockSymbol']} in {trade['Account']} (trade {short.idxmax() + 1} of {len(trades_df)})"
+            
+            # First, add all trades to the trade history, as normalized above
+            if not self.data_manager.add_trades(trades_df.to_dict('records')):
+                return False, "Failed to record trades in trade history"
+            
+            # Then update the affected holdings in one write
+            updated = replay_trades(trades_df, opening if not opening.empty else None)
+            if not updated.empty and not self.data_manager.upsert_consolidated_records(updated):
+                return False, "Failed to update consolidated record"
+            
+            return True, f"{len(trades_df)} trades processed successfully. Holdings updated: {len(updated)}"
+                
+        except Exception as e:
+            return False, f"Error processing trades: {str(e)}"
+    
     def add_existing_holding(self, holding_data: Dict) -> Tuple[bool, str]:
         """
         Add an existing holding to the consolidated record (for pre-population).
@@ -195,8 +402,8 @@ class TradeCalculator:
             # Create new consolidated record
             updated_data = {
                 'StockName': holding_data['StockName'],
-                'Quantity': int(quantity),
-                'AveragePricePerShare': round(cost_per_share, 4),
+                'Quantity': quantity,
+                'AveragePricePerShare': cost_per_share,
                 'CapitalGainLoss': 0,
                 'DateOfAcquisition': holding_data['DateOfAcquisition']
             }
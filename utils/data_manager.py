@@ -1,99 +1,194 @@
 import pandas as pd
+from pandas.api.types import is_numeric_dtype
+import pyarrow as pa
+import pyarrow.csv as pv
 import os
 from typing import Dict, List, Optional
 import streamlit as st
 
+# Table schemas
+CONSOLIDATED_COLUMNS = [
+    "Account", "StockName", "StockSymbol", "Quantity",
+    "AveragePricePerShare", "CapitalGainLoss", "DateOfAcquisition"
+]
+
+TRADES_COLUMNS = [
+    "Account", "StockName", "StockSymbol", "DateOfTrade",
+    "TradeType", "SharesTraded", "PricePerShare", "Commission"
+]
+
+# Column types enforced before writing, so Parquet stores typed columns
+DATE_COLUMNS = ["DateOfAcquisition", "DateOfTrade"]
+INTEGER_COLUMNS = ["Quantity", "SharesTraded"]
+FLOAT_COLUMNS = ["AveragePricePerShare", "CapitalGainLoss", "PricePerShare", "Commission"]
+# Low-cardinality text columns, stored and read as categories so filters compare
+# integer codes and unique values come straight from the category list
+CATEGORY_COLUMNS = ["Account", "StockName", "StockSymbol", "TradeType"]
+# Decimal places kept on disk; calculations work at full precision and round only here
+ROUNDED_COLUMNS = {"AveragePricePerShare": 4, "CapitalGainLoss": 2}
+
+def _as_categories(df: pd.DataFrame) -> pd.DataFrame:
+    """Return df with the category columns it has converted to category dtype, dropping unused categories."""
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category').cat.remove_unused_categories()
+    return df
+
+def _read_legacy_csv(path: str) -> pd.DataFrame:
+    """Read a CSV table from earlier versions with pyarrow's parser and known column types."""
+    # Numbers are read as floats since older files hold quantities like "10.0"; dates stay
+    # text because their format varies, and _coerce_types settles both before writing
+    column_types = {col: pa.float64() for col in INTEGER_COLUMNS + FLOAT_COLUMNS}
+    column_types.update({col: pa.string() for col in CATEGORY_COLUMNS + DATE_COLUMNS})
+    table = pv.read_csv(path, convert_options=pv.ConvertOptions(column_types=column_types))
+    return table.to_pandas()
+
+def _coerce_types(df: pd.DataFrame) -> pd.DataFrame:
+    """Return df with date, integer and float columns converted to their stored types."""
+    df = df.copy()
+    for col in df.columns:
+        if col in DATE_COLUMNS:
+            # Older CSVs mix "YYYY-MM-DD" and "YYYY-MM-DD HH:MM:SS" values
+            df[col] = pd.to_datetime(df[col], errors='coerce', format='mixed')
+        elif col in INTEGER_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).round().astype('int64')
+        elif col in FLOAT_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+            if col in ROUNDED_COLUMNS:
+                df[col] = df[col].round(ROUNDED_COLUMNS[col])
+    return _as_categories(df)
+
 class DataManager:
-    """Handles all CSV file operations for the stock tracker app."""
+    """Handles all file operations for the stock tracker app."""
     
     def __init__(self, data_dir: str = "data"):
         self.data_dir = data_dir
-        self.consolidated_path = os.path.join(data_dir, "consolidated.csv")
-        self.trades_path = os.path.join(data_dir, "trades.csv")
+        self.consolidated_path = os.path.join(data_dir, "consolidated.parquet")
+        self.trades_path = os.path.join(data_dir, "trades.parquet")
+        
+        # Parsed tables keyed by path, stored as (mtime, DataFrame)
+        self._cache = {}
+        # Column arrays of the consolidated table plus a (Account, StockSymbol) -> row
+        # position index, stored as (source frame, index, columns)
+        self._holdings = None
         
         # Ensure data directory exists
         os.makedirs(data_dir, exist_ok=True)
         
-        # Initialize CSV files if they don't exist
+        # Initialize data files if they don't exist
         self._initialize_files()
     
     def _initialize_files(self):
-        """Initialize CSV files with headers if they don't exist."""
-        # Consolidated CSV headers
-        consolidated_headers = [
-            "Account", "StockName", "StockSymbol", "Quantity", 
-            "AveragePricePerShare", "CapitalGainLoss", "DateOfAcquisition"
-        ]
+        """Create the Parquet files if they don't exist, importing any legacy CSV data."""
+        for path, columns in ((self.consolidated_path, CONSOLIDATED_COLUMNS),
+                              (self.trades_path, TRADES_COLUMNS)):
+            if os.path.exists(path):
+                continue
+            
+            # Earlier versions stored the same tables as CSV next to the Parquet path
+            csv_path = os.path.splitext(path)[0] + ".csv"
+            try:
+                if os.path.exists(csv_path):
+                    df = _read_legacy_csv(csv_path)
+                else:
+                    df = pd.DataFrame(columns=columns)
+                self._write(df, path)
+            except Exception as e:
+                # No Parquet file is left behind, so the import runs again on the next start
+                st.error(f"Error initializing {os.path.basename(path)}: {e}")
+    
+    def _table(self, path: str) -> pd.DataFrame:
+        """Return the cached table for path, re-parsing the file only when its mtime has changed.
         
-        # Trades CSV headers
-        trades_headers = [
-            "Account", "StockName", "StockSymbol", "DateOfTrade", 
-            "TradeType", "SharesTraded", "PricePerShare", "Commission"
-        ]
+        The returned frame is shared with the cache and must not be modified in place.
+        """
+        mtime = os.path.getmtime(path)
+        cached = self._cache.get(path)
+        if cached is None or cached[0] != mtime:
+            # Files written before category columns were introduced store them as plain strings
+            cached = (mtime, _as_categories(pd.read_parquet(path)))
+            self._cache[path] = cached
+        return cached[1]
+    
+    def _holdings_view(self):
+        """Return (row index, column arrays) for the cached consolidated table.
         
-        if not os.path.exists(self.consolidated_path):
-            pd.DataFrame(columns=consolidated_headers).to_csv(
-                self.consolidated_path, index=False
-            )
+        The index maps (Account, StockSymbol) to the position of the first matching row.
+        Numeric columns are plain NumPy arrays; rebuilt only when the cached table changes.
+        """
+        df = self._table(self.consolidated_path)
+        if self._holdings is None or self._holdings[0] is not df:
+            columns = {
+                col: df[col].to_numpy() if is_numeric_dtype(df[col]) else df[col].array
+                for col in df.columns
+            }
+            index = {}
+            for pos, key in enumerate(zip(columns['Account'], columns['StockSymbol'])):
+                index.setdefault(key, pos)
+            self._holdings = (df, index, columns)
+        return self._holdings[1], self._holdings[2]
+    
+    def _read(self, path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Read a table (optionally only some columns) as a frame the caller may modify.
         
-        if not os.path.exists(self.trades_path):
-            pd.DataFrame(columns=trades_headers).to_csv(
-                self.trades_path, index=False
-            )
+        When the table isn't cached, a column subset is read straight from the file so
+        the other columns are never decoded; the projection itself is not cached.
+        """
+        if not columns:
+            return self._table(path).copy()
+        cached = self._cache.get(path)
+        if cached is None or cached[0] != os.path.getmtime(path):
+            return _as_categories(pd.read_parquet(path, columns=columns))
+        return cached[1][columns]
     
-
-    def read_consolidated(self) -> pd.DataFrame:
-        """Read the consolidated holdings data."""
+    def _write(self, df: pd.DataFrame, path: str):
+        """Write a table to Parquet with its column types enforced."""
+        df = _coerce_types(df)
+        df.to_parquet(path, index=False, compression='zstd')
+        # The written frame is what the next read would parse, so keep it instead
+        self._cache[path] = (os.path.getmtime(path), df)
+    
+    def read_consolidated(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Read the consolidated holdings data, optionally only the given columns."""
         try:
-            df = pd.read_csv(self.consolidated_path)
-            # Convert date column to datetime
-            if 'DateOfAcquisition' in df.columns:
-                df['DateOfAcquisition'] = pd.to_datetime(df['DateOfAcquisition'], errors='coerce')
-            # Ensure integer quantities
-            if 'Quantity' in df.columns:
-                df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce').fillna(0).round().astype(int)
-            return df
+            # Column types are enforced on write, so no conversion is needed here
+            return self._read(self.consolidated_path, columns)
         except Exception as e:
             st.error(f"Error reading consolidated data: {e}")
             return pd.DataFrame()
     
-    def read_trades(self) -> pd.DataFrame:
-        """Read the trades history data."""
+    def read_trades(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Read the trades history data, optionally only the given columns."""
         try:
-            df = pd.read_csv(self.trades_path)
-            # Convert date column to datetime
-            if 'DateOfTrade' in df.columns:
-                df['DateOfTrade'] = pd.to_datetime(df['DateOfTrade'], errors='coerce')
-            # Ensure integer shares traded
-            if 'SharesTraded' in df.columns:
-                df['SharesTraded'] = pd.to_numeric(df['SharesTraded'], errors='coerce').fillna(0).round().astype(int)
-            return df
+            # Column types are enforced on write, so no conversion is needed here
+            return self._read(self.trades_path, columns)
         except Exception as e:
             st.error(f"Error reading trades data: {e}")
             return pd.DataFrame()
     
     def write_consolidated(self, df: pd.DataFrame) -> bool:
-        """Write consolidated holdings data to CSV."""
+        """Write consolidated holdings data."""
         try:
-            df.to_csv(self.consolidated_path, index=False)
+            self._write(df, self.consolidated_path)
             return True
         except Exception as e:
             st.error(f"Error writing consolidated data: {e}")
             return False
     
     def write_trades(self, df: pd.DataFrame) -> bool:
-        """Write trades data to CSV."""
+        """Write trades data."""
         try:
-            df.to_csv(self.trades_path, index=False)
+            self._write(df, self.trades_path)
             return True
         except Exception as e:
             st.error(f"Error writing trades data: {e}")
             return False
     
     def add_trade(self, trade_data: Dict) -> bool:
-        """Add a new trade to the trades CSV."""
+        """Add a new trade to the trade history."""
         try:
-            trades_df = self.read_trades()
+            # Append to the in-memory table and write it through; concat leaves the cached frame untouched
+            trades_df = self._table(self.trades_path)
             new_trade = pd.DataFrame([trade_data])
             updated_trades = pd.concat([trades_df, new_trade], ignore_index=True)
             return self.write_trades(updated_trades)
@@ -101,19 +196,35 @@ class DataManager:
             st.error(f"Error adding trade: {e}")
             return False
     
+    def add_trades(self, trades: List[Dict]) -> bool:
+        """Add several trades to the trade history with a single write."""
+        try:
+            trades_df = self._table(self.trades_path)
+            new_trades = pd.DataFrame(trades)
+            updated_trades = pd.concat([trades_df, new_trades], ignore_index=True)
+            return self.write_trades(updated_trades)
+        except Exception as e:
+            st.error(f"Error adding trades: {e}")
+            return False
+    
     def update_consolidated_record(self, account: str, stock_symbol: str, 
                                  updated_data: Dict) -> bool:
         """Update a specific consolidated record."""
         try:
-            df = self.read_consolidated()
+            df = self._table(self.consolidated_path)
             
-            # Find the record to update
-            mask = (df['Account'] == account) & (df['StockSymbol'] == stock_symbol)
+            index, _ = self._holdings_view()
+            pos = index.get((account, stock_symbol))
             
-            if mask.any():
-                # Update existing record
+            if pos is not None:
+                # Update existing record (on a copy, so the cache stays valid if the write fails)
+                df = df.copy()
                 for key, value in updated_data.items():
-                    df.loc[mask, key] = value
+                    # Category columns only accept known values, e.g. a changed StockName
+                    if key in df.columns and isinstance(df[key].dtype, pd.CategoricalDtype) \
+                            and value not in df[key].cat.categories:
+                        df[key] = df[key].cat.add_categories([value])
+                df.loc[df.index[pos], list(updated_data)] = list(updated_data.values())
             else:
                 # Add new record
                 new_record = {
@@ -129,14 +240,41 @@ class DataManager:
             st.error(f"Error updating consolidated record: {e}")
             return False
     
+    def upsert_consolidated_records(self, records: pd.DataFrame) -> bool:
+        """Replace the consolidated records matching each row's (Account, StockSymbol) and add the rest, with a single write."""
+        try:
+            index, _ = self._holdings_view()
+            positions = [index.get(key) for key in zip(records['Account'], records['StockSymbol'])]
+            existing = [pos is not None for pos in positions]
+            
+            # Plain object columns accept any value; category dtypes are restored on write
+            df = self._table(self.consolidated_path)
+            df = df.astype({col: object for col in CATEGORY_COLUMNS if col in df.columns})
+            
+            updates = records[existing]
+            if not updates.empty:
+                rows = df.index[[pos for pos in positions if pos is not None]]
+                for col in updates.columns:
+                    df.loc[rows, col] = updates[col].to_numpy()
+            
+            new_records = records[[not found for found in existing]]
+            if df.empty:
+                df = new_records.reset_index(drop=True)
+            elif not new_records.empty:
+                df = pd.concat([df, new_records], ignore_index=True)
+            return self.write_consolidated(df)
+        except Exception as e:
+            st.error(f"Error updating consolidated records: {e}")
+            return False
+    
     def get_consolidated_record(self, account: str, stock_symbol: str) -> Optional[Dict]:
         """Get a specific consolidated record."""
         try:
-            df = self.read_consolidated()
-            mask = (df['Account'] == account) & (df['StockSymbol'] == stock_symbol)
+            index, columns = self._holdings_view()
+            pos = index.get((account, stock_symbol))
             
-            if mask.any():
-                return df[mask].iloc[0].to_dict()
+            if pos is not None:
+                return {col: values[pos] for col, values in columns.items()}
             return None
         except Exception as e:
             st.error(f"Error getting consolidated record: {e}")
@@ -145,8 +283,8 @@ class DataManager:
     def get_accounts(self) -> List[str]:
         """Get list of unique accounts."""
         try:
-            df = self.read_consolidated()
-            return sorted(df['Account'].unique().tolist()) if not df.empty else []
+            df = self._table(self.consolidated_path)
+            return sorted(df['Account'].cat.categories.tolist()) if not df.empty else []
         except Exception as e:
             st.error(f"Error getting accounts: {e}")
             return []
@@ -154,8 +292,8 @@ class DataManager:
     def get_stock_symbols(self) -> List[str]:
         """Get list of unique stock symbols."""
         try:
-            df = self.read_consolidated()
-            return sorted(df['StockSymbol'].unique().tolist()) if not df.empty else []
+            df = self._table(self.consolidated_path)
+            return sorted(df['StockSymbol'].cat.categories.tolist()) if not df.empty else []
         except Exception as e:
             st.error(f"Error getting stock symbols: {e}")
             return []
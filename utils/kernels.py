@@ -0,0 +1,64 @@
+import numpy as np
+
+# numba is optional: when it is installed the replay loop is compiled to machine
+# code, otherwise the same function runs as plain Python.
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        """Stand-in for numba.njit that returns the function unchanged."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+# Event kinds understood by replay_holding
+EVENT_OPENING = 0
+EVENT_BUY = 1
+EVENT_SELL = 2
+
+@njit(cache=True)
+def replay_holding(kind, shares, amount, opening_avg, opening_gain):
+    """
+    Replay one holding's events in order and return (quantity, average price, capital gain/loss).
+
+    `kind` holds EVENT_* codes. For buys `amount` is the cost of the trade (shares × price
+    + commission), for sells the net proceeds (shares × price - commission). Opening events
+    set the position from an existing holding's quantity, average price and gain/loss.
+    """
+    quantity = 0.0
+    avg_price = 0.0
+    gain_loss = 0.0
+    for i in range(kind.shape[0]):
+        if kind[i] == EVENT_OPENING:
+            quantity += shares[i]
+            avg_price = opening_avg[i]
+            gain_loss += opening_gain[i]
+        elif kind[i] == EVENT_BUY:
+            new_quantity = quantity + shares[i]
+            if new_quantity > 0:
+                avg_price = (quantity * avg_price + amount[i]) / new_quantity
+            quantity = new_quantity
+        else:
+            gain_loss += amount[i] - shares[i] * avg_price
+            quantity -= shares[i]
+    return quantity, avg_price, gain_loss
+
+def replay_holdings(kind, shares, amount, opening_avg, opening_gain, groups):
+    """
+    Run replay_holding over each group of event positions.
+
+    `groups` is a list of index arrays (e.g. from DataFrameGroupBy.indices), each in
+    event order. Returns quantity, average price and gain/loss arrays, one entry per group.
+    """
+    quantity = np.empty(len(groups))
+    avg_price = np.empty(len(groups))
+    gain_loss = np.empty(len(groups))
+    for g, positions in enumerate(groups):
+        quantity[g], avg_price[g], gain_loss[g] = replay_holding(
+            kind[positions], shares[positions], amount[positions],
+            opening_avg[positions], opening_gain[positions]
+        )
+    return quantity, avg_price, gain_loss